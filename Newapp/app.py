@@ -1,7 +1,8 @@
 # app.py
+import numpy as np
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 
 from config import EXPECTED_PER_MEMBER
 from auth import (
@@ -12,20 +13,92 @@ from auth import (
 from database import (
     init_db,
     get_all_contributions,
+    search_contributions,
+    get_members_below_expected,
+    get_totals_by_member,
+    get_overall_metrics,
     add_contribution,
+    add_contributions_bulk,
     delete_contribution_with_reason,
     create_special_project,
     get_all_special_projects,
+    get_project_document,
     add_special_project_contribution,
-    get_special_project_contributions,
+    get_all_special_contributions,
     delete_special_contribution_with_reason,
     add_project_income,
-    get_project_income,
+    get_all_project_incomes,
     delete_project_income_with_reason,
-    get_project_financial_summary,
 )
 
 DIVISOR = 120  # All money inputs divided by 120
+RECENT_LIMIT = 200  # Rows loaded for the recent table / delete selector
+
+
+def money(amounts):
+    """Format a column of amounts as "$1234.50" strings in one vectorized pass."""
+    return np.char.add("$", np.char.mod("%.2f", np.asarray(amounts, dtype=float)))
+
+
+def label_text(values):
+    """A text column as label-safe strings: NULLs become "" instead of NaN."""
+    return values.astype(object).fillna("").astype(str)
+
+
+def import_contributions_csv(csv_file):
+    """Bulk-insert an uploaded CSV (member, amount, month), once per upload."""
+    if st.session_state.get("imported_csv_id") == csv_file.file_id:
+        st.warning("This file has already been imported.")
+        return
+    try:
+        import_df = pd.read_csv(csv_file)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        st.error(f"Could not read CSV: {e}")
+        return
+    missing = {"member", "amount", "month"} - set(import_df.columns)
+    if missing:
+        st.error(f"Missing columns: {', '.join(sorted(missing))}")
+        return
+    amount = pd.to_numeric(import_df["amount"], errors="coerce")
+    valid = import_df["member"].notna() & import_df["month"].notna() & (amount > 0)
+    rows = import_df.loc[valid, ["member", "month"]].assign(
+        amount=(amount[valid] / DIVISOR).round(2)
+    )
+    skipped = len(import_df) - len(rows)
+    if rows.empty:
+        st.error(f"No valid rows to import ({skipped} skipped: need member, month and an amount > 0).")
+        return
+    add_contributions_bulk(rows[["member", "amount", "month"]].to_dict("records"))
+    st.session_state["imported_csv_id"] = csv_file.file_id
+    if skipped:
+        st.warning(f"Imported {len(rows)} contributions, skipped {skipped} invalid rows.")
+    else:
+        st.success(f"Imported {len(rows)} contributions.")
+
+
+# --------------------------
+# MUTATION CALLBACKS
+# --------------------------
+# Widgets rendered above a mutation would be stale if it ran inline, so these
+# run as on_click callbacks: Streamlit calls them before the next script run,
+# which then renders fresh data once (no extra st.rerun()).
+def delete_with_reason(delete_fn, select_key, reason_key, deleted_by, done_msg):
+    reason = st.session_state.get(reason_key, "")
+    if not reason.strip():
+        st.toast("Please provide a reason.", icon="⚠️")
+        return
+    if not delete_fn(st.session_state[select_key], deleted_by, reason):
+        st.toast("That record was already deleted.", icon="⚠️")
+        return
+    st.session_state[reason_key] = ""
+    st.toast(done_msg)
+
+
+def add_project_entry(add_fn, project_id, label_key, amount_key, notes_key, done_msg):
+    amount = round(st.session_state[amount_key] / DIVISOR, 2)
+    add_fn(int(project_id), st.session_state[label_key], amount, st.session_state[notes_key])
+    st.toast(done_msg)
+
 
 st.set_page_config(page_title="💰 DKSV TEAM", layout="wide")
 
@@ -103,8 +176,6 @@ user_role = get_user_role(username) or "viewer"
 
 main_tab, projects_tab = st.tabs(["📊 Monthly Contributions", "🎯 Special Projects"])
 
-df = get_all_contributions()
-
 # --------------------------
 # SIDEBAR (ADMIN)
 # --------------------------
@@ -125,25 +196,35 @@ if user_role == "admin":
                     amount = round(amount_raw / DIVISOR, 2)
                     add_contribution(member_name, amount, month)
                     st.success("Contribution added.")
-                    st.rerun()
+
+        # Bulk import
+        st.subheader("📥 Import Contributions")
+        csv_file = st.file_uploader("CSV with columns: member, amount, month", type="csv")
+        if csv_file is not None and st.button("Import CSV"):
+            import_contributions_csv(csv_file)
 
         # Delete contribution
         st.subheader("🗑️ Delete Contribution")
+        member_query = st.text_input("Search member (for older entries)").strip()
+        if member_query:
+            df = search_contributions(member_query, limit=RECENT_LIMIT)
+        else:
+            df = get_all_contributions(limit=RECENT_LIMIT)
         if not df.empty:
-            df_del = df.copy()
-            df_del["label"] = df_del.apply(
-                lambda r: f"{r['member']} | {r['month']} | ${r['amount']:.2f}", axis=1
+            labels = dict(zip(
+                df["id"],
+                label_text(df["member"]) + " | " + label_text(df["month"])
+                + " | " + money(df["amount"]),
+            ))
+            st.selectbox("Select entry:", list(labels), format_func=labels.get, key="sel_entry")
+            st.text_area("Reason for deletion (required)", key="reason_entry")
+            st.button(
+                "Delete Entry",
+                type="primary",
+                on_click=delete_with_reason,
+                args=(delete_contribution_with_reason, "sel_entry", "reason_entry",
+                      username, "Entry deleted and logged."),
             )
-            selected = st.selectbox("Select entry:", df_del["label"])
-            reason = st.text_area("Reason for deletion (required)")
-            if st.button("Delete Entry", type="primary"):
-                if not reason.strip():
-                    st.error("Please provide a reason.")
-                else:
-                    entry_id = int(df_del.loc[df_del["label"] == selected, "id"].iloc[0])
-                    delete_contribution_with_reason(entry_id, username, reason)
-                    st.success("Entry deleted and logged.")
-                    st.rerun()
         else:
             st.info("No entries to delete.")
 else:
@@ -156,33 +237,30 @@ else:
 with main_tab:
     st.header("📊 Monthly Contributions")
 
-    if df.empty:
+    metrics = get_overall_metrics()
+    if metrics["entries"] == 0:
         st.info("No contributions recorded yet.")
     else:
         # Metrics
         c1, c2, c3 = st.columns(3)
-        c1.metric("Total Collected", f"${df['amount'].sum():,.2f}")
-        c2.metric("Contributors", df["member"].nunique())
-        c3.metric("Entries", len(df))
+        c1.metric("Total Collected", f"${metrics['total']:,.2f}")
+        c2.metric("Contributors", metrics["contributors"])
+        c3.metric("Entries", metrics["entries"])
 
         st.divider()
 
         # Expected per month check (per member, per month)
         st.subheader("📅 Monthly Expected Contribution Check")
-        monthly_group = df.groupby(["month", "member"], as_index=False)["amount"].sum()
-
-        warnings = []
-        for _, row in monthly_group.iterrows():
-            if row["amount"] < EXPECTED_PER_MEMBER:
-                warnings.append(
-                    f"{row['member']} contributed ${row['amount']:.2f} in {row['month']} "
-                    f"(expected ${EXPECTED_PER_MEMBER:.2f})"
-                )
+        under = get_members_below_expected(EXPECTED_PER_MEMBER)
+
+        warnings = (
+            label_text(under["member"]) + " contributed " + money(under["amount"])
+            + " in " + label_text(under["month"]) + f" (expected ${EXPECTED_PER_MEMBER:.2f})"
+        ).tolist()
 
         if warnings:
             st.warning("⚠️ Members below expected monthly contribution:")
-            for w in warnings:
-                st.write(f"- {w}")
+            st.write("\n".join(f"- {w}" for w in warnings))
         else:
             st.success("All members met expected monthly contributions.")
 
@@ -190,22 +268,27 @@ with main_tab:
 
         # Recent contributions
         st.subheader("Recent Contributions")
-        st.dataframe(df.sort_values("date", ascending=False), use_container_width=True)
+        # The full table is only fetched once the user asks for it
+        if st.toggle("Show recent contributions", key="show_recent"):
+            limit = st.number_input("Show last N", min_value=50, value=RECENT_LIMIT, step=50)
+            df = get_all_contributions(limit=int(limit))
+            st.dataframe(df, use_container_width=True)
 
         st.divider()
 
         # Simple chart by member
         st.subheader("📈 Total by Member")
-        by_member = df.groupby("member", as_index=False)["amount"].sum()
-        fig = px.bar(
-            by_member,
-            x="member",
-            y="amount",
+        by_member = get_totals_by_member()
+        x = by_member["member"].to_numpy()
+        y = by_member["amount"].to_numpy()
+        fig = go.Figure(go.Bar(x=x, y=y, marker=dict(color=y, colorscale="Blues", showscale=True)))
+        fig.update_layout(
             title="Total Contributed per Member",
-            color="amount",
-            color_continuous_scale="Blues",
+            xaxis_title="member",
+            yaxis_title="amount",
+            margin=dict(l=0, r=0, t=40, b=0),
         )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, use_container_width=True, theme=None)
 
 # --------------------------
 # SPECIAL PROJECTS TAB
@@ -231,113 +314,145 @@ with projects_tab:
                         deadline_str = proj_deadline.isoformat() if proj_deadline else None
                         create_special_project(proj_name, proj_desc, proj_target, deadline_str, proj_doc)
                         st.success("Project created.")
-                        st.rerun()
 
     # List projects
     projects_df = get_all_special_projects()
     if projects_df.empty:
         st.info("No special projects yet.")
     else:
+        # Fetch every project's data once, then slice per project in the loop
+        all_contribs = get_all_special_contributions()
+        all_incomes = get_all_project_incomes()
+        contribs_by_project = {
+            pid: group.drop(columns="project_id")
+            for pid, group in all_contribs.groupby("project_id")
+        }
+        incomes_by_project = {
+            pid: group.drop(columns="project_id")
+            for pid, group in all_incomes.groupby("project_id")
+        }
+        empty_contribs = all_contribs.drop(columns="project_id").iloc[0:0]
+        empty_incomes = all_incomes.drop(columns="project_id").iloc[0:0]
+
         for _, project in projects_df.iterrows():
             st.divider()
             st.subheader(f"📌 {project['project_name']}")
             if project["description"]:
                 st.write(project["description"])
 
-            summary = get_project_financial_summary(project["id"])
+            # Document is only fetched once the user asks for it
+            if project["has_document"] and st.toggle(
+                "📎 Project document", key=f"doc_{project['id']}"
+            ):
+                document = get_project_document(project["id"])
+                if document:
+                    file_name, data = document
+                    st.download_button(
+                        "⬇️ Download Document",
+                        data,
+                        file_name=file_name,
+                        key=f"dl_doc_{project['id']}",
+                    )
+                else:
+                    st.warning("Document file not found.")
+
             c1, c2, c3 = st.columns(3)
-            c1.metric("Contributions", f"${summary['contributions']:,.2f}")
-            c2.metric("Income", f"${summary['income']:,.2f}")
-            c3.metric("Total", f"${summary['total']:,.2f}")
+            c1.metric("Contributions", f"${project['contributions']:,.2f}")
+            c2.metric("Income", f"${project['income']:,.2f}")
+            c3.metric("Total", f"${project['total']:,.2f}")
 
             # Add special contribution
             if user_role == "admin":
                 with st.expander("➕ Add Special Contribution"):
                     with st.form(f"add_contrib_{project['id']}"):
-                        name = st.text_input("Contributor Name")
-                        amount_raw = st.number_input("Amount", min_value=0.0)
-                        notes = st.text_area("Notes")
-                        if st.form_submit_button("Add"):
-                            amount = round(amount_raw / DIVISOR, 2)
-                            add_special_project_contribution(project["id"], name, amount, notes)
-                            st.success("Contribution added.")
-                            st.rerun()
+                        st.text_input("Contributor Name", key=f"contrib_name_{project['id']}")
+                        st.number_input("Amount", min_value=0.0, key=f"contrib_amount_{project['id']}")
+                        st.text_area("Notes", key=f"contrib_notes_{project['id']}")
+                        st.form_submit_button(
+                            "Add",
+                            on_click=add_project_entry,
+                            args=(add_special_project_contribution, project["id"],
+                                  f"contrib_name_{project['id']}",
+                                  f"contrib_amount_{project['id']}",
+                                  f"contrib_notes_{project['id']}",
+                                  "Contribution added."),
+                        )
 
             # Show contributions
-            contrib_df = get_special_project_contributions(project["id"])
+            contrib_df = contribs_by_project.get(project["id"], empty_contribs)
             st.subheader("📋 Contributions")
             st.dataframe(contrib_df, use_container_width=True)
 
             if user_role == "admin" and not contrib_df.empty:
-                contrib_df["label"] = contrib_df.apply(
-                    lambda r: f"{r['name']} | ${r['amount']:.2f}", axis=1
-                )
-                selected = st.selectbox(
+                labels = dict(zip(
+                    contrib_df["id"],
+                    label_text(contrib_df["name"]) + " | " + money(contrib_df["amount"]),
+                ))
+                st.selectbox(
                     "Select contribution to delete:",
-                    contrib_df["label"],
+                    list(labels),
+                    format_func=labels.get,
                     key=f"sel_contrib_{project['id']}",
                 )
-                reason = st.text_area(
+                st.text_area(
                     "Reason for deletion (required)",
                     key=f"reason_contrib_{project['id']}",
                 )
-                if st.button(
+                st.button(
                     "Delete Contribution",
                     key=f"btn_del_contrib_{project['id']}",
                     type="primary",
-                ):
-                    if not reason.strip():
-                        st.error("Please provide a reason.")
-                    else:
-                        contrib_id = int(contrib_df.loc[
-                            contrib_df["label"] == selected, "id"
-                        ].iloc[0])
-                        delete_special_contribution_with_reason(contrib_id, username, reason)
-                        st.success("Contribution deleted and logged.")
-                        st.rerun()
+                    on_click=delete_with_reason,
+                    args=(delete_special_contribution_with_reason,
+                          f"sel_contrib_{project['id']}",
+                          f"reason_contrib_{project['id']}",
+                          username, "Contribution deleted and logged."),
+                )
 
             # Add income
             if user_role == "admin":
                 with st.expander("➕ Add Project Income"):
                     with st.form(f"add_income_{project['id']}"):
-                        source = st.text_input("Income Source")
-                        amount_raw = st.number_input("Amount", min_value=0.0)
-                        notes = st.text_area("Notes")
-                        if st.form_submit_button("Add Income"):
-                            amount = round(amount_raw / DIVISOR, 2)
-                            add_project_income(project["id"], source, amount, notes)
-                            st.success("Income added.")
-                            st.rerun()
+                        st.text_input("Income Source", key=f"income_source_{project['id']}")
+                        st.number_input("Amount", min_value=0.0, key=f"income_amount_{project['id']}")
+                        st.text_area("Notes", key=f"income_notes_{project['id']}")
+                        st.form_submit_button(
+                            "Add Income",
+                            on_click=add_project_entry,
+                            args=(add_project_income, project["id"],
+                                  f"income_source_{project['id']}",
+                                  f"income_amount_{project['id']}",
+                                  f"income_notes_{project['id']}",
+                                  "Income added."),
+                        )
 
             # Show income
-            income_df = get_project_income(project["id"])
+            income_df = incomes_by_project.get(project["id"], empty_incomes)
             st.subheader("📋 Income")
             st.dataframe(income_df, use_container_width=True)
 
             if user_role == "admin" and not income_df.empty:
-                income_df["label"] = income_df.apply(
-                    lambda r: f"{r['source']} | ${r['amount']:.2f}", axis=1
-                )
-                selected = st.selectbox(
+                labels = dict(zip(
+                    income_df["id"],
+                    label_text(income_df["source"]) + " | " + money(income_df["amount"]),
+                ))
+                st.selectbox(
                     "Select income to delete:",
-                    income_df["label"],
+                    list(labels),
+                    format_func=labels.get,
                     key=f"sel_income_{project['id']}",
                 )
-                reason = st.text_area(
+                st.text_area(
                     "Reason for deletion (required)",
                     key=f"reason_income_{project['id']}",
                 )
-                if st.button(
+                st.button(
                     "Delete Income",
                     key=f"btn_del_income_{project['id']}",
                     type="primary",
-                ):
-                    if not reason.strip():
-                        st.error("Please provide a reason.")
-                    else:
-                        income_id = int(income_df.loc[
-                            income_df["label"] == selected, "id"
-                        ].iloc[0])
-                        delete_project_income_with_reason(income_id, username, reason)
-                        st.success("Income deleted and logged.")
-                        st.rerun()
+                    on_click=delete_with_reason,
+                    args=(delete_project_income_with_reason,
+                          f"sel_income_{project['id']}",
+                          f"reason_income_{project['id']}",
+                          username, "Income deleted and logged."),
+                )
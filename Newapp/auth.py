@@ -13,6 +13,7 @@ Features:
 import streamlit as st
 import streamlit_authenticator as stauth
 import sqlite3
+import threading
 import bcrypt
 
 # ==========================
@@ -21,50 +22,91 @@ import bcrypt
 
 DB_FILE = "users.db"
 SIGNATURE_KEY = "simple_auth_key_12345"
+BCRYPT_ROUNDS = 10  # ~4x faster than the default of 12
+
+
+# ==========================
+# DATABASE CONNECTION
+# ==========================
+
+@st.cache_resource
+def get_connection():
+    """
+    Return one shared SQLite connection for the whole process.
+    Streamlit reruns the script on every interaction, so opening a fresh
+    connection per query would repeat the file open + setup each time.
+    """
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# The connection is shared by every session thread, and sqlite3 leaves
+# serializing access to the caller: a commit/rollback (or rowcount) on it
+# covers whatever any thread last ran. Hold this around each use.
+_db_lock = threading.Lock()
 
 
 # ==========================
 # DATABASE INITIALIZATION
 # ==========================
 
+_users_db_initialized = False
+
+
 def init_users_db():
-    """Create users table if it does not exist."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT,
-            role TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+    """Create users table if it does not exist (once per process)."""
+    global _users_db_initialized
+    if _users_db_initialized:
+        return
 
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+
+    with _db_lock:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                password TEXT NOT NULL,
+                email TEXT,
+                role TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Makes the case-insensitive LOWER(username) lookups index-usable
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_lower_username
+            ON users (LOWER(username))
+        """)
+
+        conn.commit()
+    _users_db_initialized = True
 
 
 # ==========================
 # USER RETRIEVAL
 # ==========================
 
+@st.cache_data(show_spinner=False)
 def load_users_from_db():
     """
     Load all users in the format required by streamlit-authenticator.
+    Cached across sessions; cleared whenever a user is added or a password changes.
     Returns:
         dict: {username: {name, password, email, role}}
     """
     init_users_db()
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
 
-    cursor.execute("SELECT username, name, password, email, role FROM users")
-    rows = cursor.fetchall()
-    conn.close()
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT username, name, password, email, role FROM users")
+        rows = cursor.fetchall()
 
     users = {}
     for username, name, password, email, role in rows:
@@ -80,40 +122,41 @@ def load_users_from_db():
 
 def get_all_users():
     """Return list of all users with basic info."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
 
-    cursor.execute("SELECT username, name, role FROM users ORDER BY created_at DESC")
-    users = cursor.fetchall()
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT username, name, role FROM users ORDER BY created_at DESC")
+        users = cursor.fetchall()
 
-    conn.close()
     return users
 
 
+@st.cache_data(ttl=30, show_spinner=False)
 def get_user_role(username):
     """Return the role of a user (admin/viewer)."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
 
-    cursor.execute(
-        "SELECT role FROM users WHERE LOWER(username) = LOWER(?)",
-        (username,)
-    )
-    result = cursor.fetchone()
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT role FROM users WHERE LOWER(username) = LOWER(?)",
+            (username,)
+        )
+        result = cursor.fetchone()
 
-    conn.close()
     return result[0] if result else None
 
 
 def get_user_count():
     """Return total number of registered users."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
 
-    cursor.execute("SELECT COUNT(*) FROM users")
-    count = cursor.fetchone()[0]
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        count = cursor.fetchone()[0]
 
-    conn.close()
     return count
 
 
@@ -123,13 +166,13 @@ def get_user_count():
 
 def user_exists(username):
     """Check if a username already exists."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
 
-    cursor.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username,))
-    exists = cursor.fetchone()[0] > 0
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username,))
+        exists = cursor.fetchone()[0] > 0
 
-    conn.close()
     return exists
 
 
@@ -139,21 +182,23 @@ def save_user_to_db(username, name, hashed_password, email=None):
     First user becomes admin automatically.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        conn = get_connection()
 
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
+        with _db_lock, conn:  # commit on success, roll back on error
+            cursor = conn.cursor()
 
-        role = "admin" if user_count == 0 else "viewer"
+            cursor.execute("SELECT COUNT(*) FROM users")
+            user_count = cursor.fetchone()[0]
 
-        cursor.execute("""
-            INSERT INTO users (username, name, password, email, role)
-            VALUES (?, ?, ?, ?, ?)
-        """, (username, name, hashed_password, email, role))
+            role = "admin" if user_count == 0 else "viewer"
 
-        conn.commit()
-        conn.close()
+            cursor.execute("""
+                INSERT INTO users (username, name, password, email, role)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, name, hashed_password, email, role))
+
+        get_user_role.clear()
+        load_users_from_db.clear()
         return True
 
     except sqlite3.IntegrityError:
@@ -170,20 +215,22 @@ def save_user_to_db(username, name, hashed_password, email=None):
 def update_password(username, new_password):
     """Update a user's password (hashed)."""
     try:
-        hashed = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+        hashed = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        conn = get_connection()
 
-        cursor.execute(
-            "UPDATE users SET password = ? WHERE LOWER(username) = LOWER(?)",
-            (hashed, username)
-        )
+        with _db_lock, conn:
+            cursor = conn.cursor()
 
-        updated = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                "UPDATE users SET password = ? WHERE LOWER(username) = LOWER(?)",
+                (hashed, username)
+            )
 
+            updated = cursor.rowcount > 0
+
+        if updated:
+            load_users_from_db.clear()
         return updated
 
     except Exception as e:
@@ -193,16 +240,15 @@ def update_password(username, new_password):
 
 def verify_user_email(username, email):
     """Check if username + email match."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT COUNT(*) FROM users WHERE LOWER(username)=LOWER(?) AND LOWER(email)=LOWER(?)",
-        (username, email)
-    )
+    conn = get_connection()
 
-    match = cursor.fetchone()[0] > 0
-    conn.close()
+    with _db_lock:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM users WHERE LOWER(username)=LOWER(?) AND LOWER(email)=LOWER(?)",
+            (username, email)
+        )
+        match = cursor.fetchone()[0] > 0
     return match
 
 
@@ -213,6 +259,8 @@ def verify_user_email(username, email):
 def setup_authentication():
     """
     Prepare Streamlit-Authenticator with DB-backed credentials.
+    The Authenticate object itself is per session (it renders a cookie
+    component), but the user rows behind it come from the shared cache.
     Returns:
         authenticator, users_dict
     """
@@ -253,6 +301,11 @@ def register_user_ui():
                 st.error("Please fill all fields")
                 return
 
+            # Same user submitted again on a rerun: don't hash/insert twice
+            if st.session_state.get("just_registered") == username:
+                st.info(f"User '{username}' is already registered.")
+                return
+
             if pw1 != pw2:
                 st.error("Passwords do not match")
                 return
@@ -265,9 +318,10 @@ def register_user_ui():
                 st.error("Username already exists")
                 return
 
-            hashed = bcrypt.hashpw(pw1.encode(), bcrypt.gensalt()).decode()
+            hashed = bcrypt.hashpw(pw1.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
             if save_user_to_db(username, name, hashed, email):
+                st.session_state["just_registered"] = username
                 if get_user_count() == 1:
                     st.success(f"Admin user '{username}' created!")
                 else:
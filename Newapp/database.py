@@ -1,21 +1,153 @@
 # database.py
-from sqlalchemy import create_engine, text
-import pandas as pd
-from config import DATABASE_URL
+import os
+import shutil
+import uuid
 
-# Create global engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+import streamlit as st
+from sqlalchemy import create_engine, event, inspect, text
+import pandas as pd
+from config import DATABASE_URL, UPLOAD_DIR
+
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")  # needed for ON DELETE CASCADE
+    cursor.close()
+
+
+# Create global engine (shared across sessions and reruns).
+# query_cache_size keeps the compiled form of the module-level SQL_* statements.
+@st.cache_resource
+def get_engine():
+    if DATABASE_URL.startswith("sqlite"):
+        engine = create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            query_cache_size=1200,
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+    # LIFO reuse keeps a small hot set of connections so idle overflow ones
+    # age out; pre-ping is off (an extra round-trip per checkout) and
+    # pool_recycle retires connections before the server side drops them.
+    return create_engine(
+        DATABASE_URL,
+        pool_size=10,
+        max_overflow=5,
+        pool_timeout=30,
+        pool_recycle=60,
+        pool_pre_ping=False,
+        pool_use_lifo=True,
+        query_cache_size=1200,
+    )
+
+
+engine = get_engine()
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+# Column types that differ between SQLite and Postgres
+ID_COLUMN = "INTEGER PRIMARY KEY AUTOINCREMENT" if IS_SQLITE else "SERIAL PRIMARY KEY"
+BLOB_TYPE = "BLOB" if IS_SQLITE else "BYTEA"
+
+
+def _fetch_df(conn, statement, columns, params=None):
+    """
+    Run a query and build the DataFrame straight from the rows.
+    Lighter than pd.read_sql for the small result sets used here, and
+    empty results still come back with the expected columns.
+    """
+    rows = conn.execute(statement, params or {}).all()
+    return pd.DataFrame.from_records(rows, columns=columns)
 
 
 # ==========================
 # INITIALIZE DATABASE
 # ==========================
+def _add_column_if_missing(conn, table, column, col_type):
+    """Small migration helper for tables created by older versions."""
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"))
+
+
+# Source table -> project_financial_totals column it rolls up into
+ROLLUP_SOURCES = {
+    "special_contributions": "contrib_sum",
+    "project_income": "income_sum",
+}
+
+
+def _rollup_trigger_ddl(table, column):
+    """Triggers that keep project_financial_totals.<column> in step with <table>."""
+    if IS_SQLITE:
+        add_new = f"""
+            INSERT INTO project_financial_totals (project_id, {column})
+            SELECT NEW.project_id, COALESCE(NEW.amount, 0) WHERE NEW.project_id IS NOT NULL
+            ON CONFLICT (project_id) DO UPDATE
+            SET {column} = project_financial_totals.{column} + excluded.{column};
+        """
+        remove_old = f"""
+            UPDATE project_financial_totals
+            SET {column} = {column} - COALESCE(OLD.amount, 0)
+            WHERE project_id = OLD.project_id;
+        """
+        return [
+            text(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_ins
+                AFTER INSERT ON {table}
+                BEGIN {add_new} END
+            """),
+            text(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_upd
+                AFTER UPDATE OF amount, project_id ON {table}
+                BEGIN {remove_old} {add_new} END
+            """),
+            text(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_totals_del
+                AFTER DELETE ON {table}
+                BEGIN {remove_old} END
+            """),
+        ]
+
+    return [
+        text(f"""
+            CREATE OR REPLACE FUNCTION {table}_totals_fn() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE project_financial_totals
+                    SET {column} = {column} - COALESCE(OLD.amount, 0)
+                    WHERE project_id = OLD.project_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.project_id IS NOT NULL THEN
+                    INSERT INTO project_financial_totals (project_id, {column})
+                    VALUES (NEW.project_id, COALESCE(NEW.amount, 0))
+                    ON CONFLICT (project_id) DO UPDATE
+                    SET {column} = project_financial_totals.{column} + EXCLUDED.{column};
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """),
+        text(f"DROP TRIGGER IF EXISTS trg_{table}_totals ON {table}"),
+        text(f"""
+            CREATE TRIGGER trg_{table}_totals
+            AFTER INSERT OR UPDATE OF amount, project_id OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_totals_fn()
+        """),
+    ]
+
+
+# Runs once per process: the schema only needs checking at startup, not on
+# every Streamlit rerun.
+@st.cache_resource(show_spinner=False)
 def init_db():
     with engine.begin() as conn:
         # Monthly contributions
-        conn.execute(text("""
+        conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS contributions (
-                id SERIAL PRIMARY KEY,
+                id {ID_COLUMN},
                 member TEXT,
                 amount DOUBLE PRECISION,
                 month TEXT,
@@ -24,22 +156,26 @@ def init_db():
         """))
 
         # Special projects
-        conn.execute(text("""
+        conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS special_projects (
-                id SERIAL PRIMARY KEY,
+                id {ID_COLUMN},
                 project_name TEXT,
                 description TEXT,
                 target_amount DOUBLE PRECISION,
                 deadline TEXT,
                 status TEXT DEFAULT 'active',
-                document BYTEA
+                document {BLOB_TYPE},
+                document_path TEXT,
+                document_name TEXT
             )
         """))
+        _add_column_if_missing(conn, "special_projects", "document_path", "TEXT")
+        _add_column_if_missing(conn, "special_projects", "document_name", "TEXT")
 
         # Special contributions
-        conn.execute(text("""
+        conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS special_contributions (
-                id SERIAL PRIMARY KEY,
+                id {ID_COLUMN},
                 project_id INTEGER REFERENCES special_projects(id) ON DELETE CASCADE,
                 name TEXT,
                 amount DOUBLE PRECISION,
@@ -49,9 +185,9 @@ def init_db():
         """))
 
         # Project income
-        conn.execute(text("""
+        conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS project_income (
-                id SERIAL PRIMARY KEY,
+                id {ID_COLUMN},
                 project_id INTEGER REFERENCES special_projects(id) ON DELETE CASCADE,
                 source TEXT,
                 amount DOUBLE PRECISION,
@@ -61,9 +197,9 @@ def init_db():
         """))
 
         # Deletion logs
-        conn.execute(text("""
+        conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS deletion_logs (
-                id SERIAL PRIMARY KEY,
+                id {ID_COLUMN},
                 record_type TEXT,
                 record_id INTEGER,
                 deleted_by TEXT,
@@ -72,94 +208,389 @@ def init_db():
             )
         """))
 
+        # Indexes for the hot lookup / sort columns
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_sc_proj_created
+            ON special_contributions (project_id, created_at DESC)
+        """))
+        # Ordered range scan for get_project_income; on Postgres INCLUDE also
+        # makes it index-only. SQLite has no INCLUDE, so it gets the plain key.
+        conn.execute(text("DROP INDEX IF EXISTS idx_pi_proj_created"))
+        if IS_SQLITE:
+            # Earlier builds put the payload columns (incl. notes) in the key
+            indexes = {
+                ix["name"]: ix["column_names"]
+                for ix in inspect(conn).get_indexes("project_income")
+            }
+            if len(indexes.get("idx_project_income_pid_created", [])) > 2:
+                conn.execute(text("DROP INDEX idx_project_income_pid_created"))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_project_income_pid_created
+                ON project_income (project_id, created_at DESC)
+            """))
+        else:
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_project_income_pid_created
+                ON project_income (project_id, created_at DESC)
+                INCLUDE (id, source, amount, notes)
+            """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_contrib_date
+            ON contributions (date DESC)
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_contrib_member_month
+            ON contributions (member, month)
+        """))
+
+        # Per-project contribution / income sums, maintained by triggers
+        needs_backfill = not inspect(conn).has_table("project_financial_totals")
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS project_financial_totals (
+                project_id INTEGER PRIMARY KEY,
+                contrib_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                income_sum DOUBLE PRECISION NOT NULL DEFAULT 0
+            )
+        """))
+        for table, column in ROLLUP_SOURCES.items():
+            for statement in _rollup_trigger_ddl(table, column):
+                conn.execute(statement)
+        if needs_backfill:
+            conn.execute(text("""
+                INSERT INTO project_financial_totals (project_id, contrib_sum, income_sum)
+                SELECT p.id,
+                       COALESCE((SELECT SUM(amount) FROM special_contributions WHERE project_id = p.id), 0),
+                       COALESCE((SELECT SUM(amount) FROM project_income WHERE project_id = p.id), 0)
+                FROM special_projects p
+            """))
+
+
+# ==========================
+# DELETION WITH AUDIT LOG
+# ==========================
+# record_type (as stored in deletion_logs) -> table the record lives in
+DELETABLE_TABLES = {
+    "contribution": "contributions",
+    "special_contribution": "special_contributions",
+    "project_income": "project_income",
+}
+
+
+def _log_and_delete_statements(record_type, table):
+    if IS_SQLITE:
+        # SQLite has no data-modifying CTEs: log from the row, then delete it
+        return (
+            text(f"""
+                INSERT INTO deletion_logs (record_type, record_id, deleted_by, reason)
+                SELECT '{record_type}', id, :user, :reason FROM {table} WHERE id = :id
+            """),
+            text(f"DELETE FROM {table} WHERE id = :id"),
+        )
+    # Postgres: delete and log in a single statement / round-trip
+    return (
+        text(f"""
+            WITH d AS (DELETE FROM {table} WHERE id = :id RETURNING id)
+            INSERT INTO deletion_logs (record_type, record_id, deleted_by, reason)
+            SELECT '{record_type}', id, :user, :reason FROM d
+        """),
+    )
+
+
+SQL_LOG_AND_DELETE = {
+    record_type: _log_and_delete_statements(record_type, table)
+    for record_type, table in DELETABLE_TABLES.items()
+}
+
+
+def _log_and_delete(record_type, record_id, deleted_by, reason):
+    """Returns False if the record no longer exists (nothing deleted or logged)."""
+    params = {"id": int(record_id), "user": deleted_by, "reason": reason}
+    with engine.begin() as conn:
+        for statement in SQL_LOG_AND_DELETE[record_type]:
+            result = conn.execute(statement, params)
+    # Last statement is the DELETE (SQLite) or the fused DELETE+INSERT (Postgres)
+    return result.rowcount > 0
+
 
 # ==========================
 # MONTHLY CONTRIBUTIONS
 # ==========================
+SQL_INSERT_CONTRIBUTION = text("""
+    INSERT INTO contributions (member, amount, month)
+    VALUES (:member, :amount, :month)
+""")
+
+
 def add_contribution(member, amount, month):
     with engine.begin() as conn:
         conn.execute(
-            text("""
-                INSERT INTO contributions (member, amount, month)
-                VALUES (:member, :amount, :month)
-            """),
+            SQL_INSERT_CONTRIBUTION,
             {"member": member, "amount": float(amount), "month": month},
         )
+    _invalidate_contributions()
+
+
+def add_contributions_bulk(rows):
+    """
+    Insert many contributions in one transaction (executemany).
+    rows: list of dicts with member, amount, month
+    """
+    if not rows:
+        return
+    params = [
+        {"member": r["member"], "amount": float(r["amount"]), "month": r["month"]}
+        for r in rows
+    ]
+    with engine.begin() as conn:
+        conn.execute(SQL_INSERT_CONTRIBUTION, params)
+    _invalidate_contributions()
+
+
+SQL_GET_ALL_CONTRIBUTIONS = text("""
+    SELECT id, member, amount, month, date
+    FROM contributions
+    ORDER BY date DESC
+    LIMIT :lim
+""")
+# LOWER(...) LIKE LOWER(...) instead of ILIKE so it also works on SQLite
+SQL_SEARCH_CONTRIBUTIONS = text("""
+    SELECT id, member, amount, month, date
+    FROM contributions
+    WHERE LOWER(member) LIKE LOWER(:q)
+    ORDER BY date DESC
+    LIMIT :lim
+""")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_all_contributions(limit=200):
+    """Most recent `limit` contributions, newest first."""
+    with engine.connect() as conn:
+        df = _fetch_df(
+            conn,
+            SQL_GET_ALL_CONTRIBUTIONS,
+            ["id", "member", "amount", "month", "date"],
+            params={"lim": int(limit)},
+        )
+    return df
 
 
-def get_all_contributions():
+@st.cache_data(ttl=60, show_spinner=False)
+def search_contributions(member_query, limit=200):
+    """Contributions whose member name contains `member_query`, newest first."""
     with engine.connect() as conn:
-        df = pd.read_sql(
-            text("""
-                SELECT id, member, amount, month, date
-                FROM contributions
-                ORDER BY date DESC
-            """),
+        df = _fetch_df(
             conn,
+            SQL_SEARCH_CONTRIBUTIONS,
+            ["id", "member", "amount", "month", "date"],
+            params={"q": f"%{member_query}%", "lim": int(limit)},
         )
     return df
 
 
-def delete_contribution_with_reason(entry_id, deleted_by, reason):
-    entry_id = int(entry_id)  # FIX
+SQL_MEMBERS_BELOW_EXPECTED = text("""
+    SELECT month, member, SUM(amount) AS amount
+    FROM contributions
+    GROUP BY month, member
+    HAVING SUM(amount) < :expected
+""")
 
-    with engine.begin() as conn:
-        conn.execute(
-            text("""
-                INSERT INTO deletion_logs (record_type, record_id, deleted_by, reason)
-                VALUES ('contribution', :id, :user, :reason)
-            """),
-            {"id": entry_id, "user": deleted_by, "reason": reason},
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_members_below_expected(expected):
+    """(month, member) pairs whose monthly total is below `expected`."""
+    with engine.connect() as conn:
+        df = _fetch_df(
+            conn,
+            SQL_MEMBERS_BELOW_EXPECTED,
+            ["month", "member", "amount"],
+            params={"expected": float(expected)},
         )
-        conn.execute(
-            text("DELETE FROM contributions WHERE id = :id"),
-            {"id": entry_id},
+    return df
+
+
+SQL_TOTALS_BY_MEMBER = text("""
+    SELECT member, SUM(amount) AS amount
+    FROM contributions
+    GROUP BY member
+""")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_totals_by_member():
+    """Total contributed per member."""
+    with engine.connect() as conn:
+        df = _fetch_df(
+            conn,
+            SQL_TOTALS_BY_MEMBER,
+            ["member", "amount"],
         )
+    return df
+
+
+SQL_OVERALL_METRICS = text("""
+    SELECT COALESCE(SUM(amount), 0), COUNT(DISTINCT member), COUNT(*)
+    FROM contributions
+""")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_overall_metrics():
+    """Headline numbers for the monthly contributions table in one query."""
+    with engine.connect() as conn:
+        total, contributors, entries = conn.execute(SQL_OVERALL_METRICS).one()
+
+    return {
+        "total": float(total),
+        "contributors": int(contributors),
+        "entries": int(entries),
+    }
+
+
+def delete_contribution_with_reason(entry_id, deleted_by, reason):
+    deleted = _log_and_delete("contribution", entry_id, deleted_by, reason)
+    _invalidate_contributions()
+    return deleted
+
+
+def _invalidate_contributions():
+    """Drop cached reads of the contributions table (other tables stay warm)."""
+    for reader in (
+        get_all_contributions,
+        search_contributions,
+        get_members_below_expected,
+        get_totals_by_member,
+        get_overall_metrics,
+    ):
+        reader.clear()
 
 
 # ==========================
 # SPECIAL PROJECTS
 # ==========================
+def _save_document(doc):
+    """Stream an uploaded file to UPLOAD_DIR in 1 MiB chunks and return its path."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    suffix = os.path.splitext(getattr(doc, "name", ""))[1] or ".bin"
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}{suffix}")
+    doc.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(doc, out, length=1 << 20)
+    return path
+
+
+SQL_INSERT_SPECIAL_PROJECT = text("""
+    INSERT INTO special_projects
+        (project_name, description, target_amount, deadline, document_path, document_name)
+    VALUES (:name, :desc, :target, :deadline, :document_path, :document_name)
+    RETURNING id
+""")
+
+
 def create_special_project(name, desc, target, deadline, doc):
-    document_bytes = doc.read() if doc else None
+    document_path = document_name = None
+    if doc:
+        document_path = _save_document(doc)
+        # The file on disk has a uuid name; keep the uploaded one for downloads
+        document_name = os.path.basename(getattr(doc, "name", "")) or None
     with engine.begin() as conn:
         result = conn.execute(
-            text("""
-                INSERT INTO special_projects (project_name, description, target_amount, deadline, document)
-                VALUES (:name, :desc, :target, :deadline, :document)
-                RETURNING id
-            """),
+            SQL_INSERT_SPECIAL_PROJECT,
             {
                 "name": name,
                 "desc": desc,
                 "target": float(target),
                 "deadline": deadline,
-                "document": document_bytes,
+                "document_path": document_path,
+                "document_name": document_name,
             },
         )
         project_id = result.scalar()
+    get_all_special_projects.clear()
     return project_id
 
 
+SQL_GET_ALL_SPECIAL_PROJECTS = text("""
+    SELECT p.id, p.project_name, p.description, p.target_amount, p.deadline, p.status,
+           CASE WHEN p.document_path IS NOT NULL OR p.document IS NOT NULL
+                THEN 1 ELSE 0 END AS has_document,
+           COALESCE(t.contrib_sum, 0) AS contributions,
+           COALESCE(t.income_sum, 0) AS income,
+           COALESCE(t.contrib_sum, 0) + COALESCE(t.income_sum, 0) AS total
+    FROM special_projects p
+    LEFT JOIN project_financial_totals t ON t.project_id = p.id
+    ORDER BY p.id DESC
+""")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_special_projects():
+    """
+    All projects with their financial summary (contributions, income, total)
+    in a single query.
+    """
     with engine.connect() as conn:
-        df = pd.read_sql(
-            text("SELECT * FROM special_projects ORDER BY id DESC"),
+        df = _fetch_df(
             conn,
+            SQL_GET_ALL_SPECIAL_PROJECTS,
+            [
+                "id", "project_name", "description", "target_amount", "deadline", "status",
+                "has_document", "contributions", "income", "total",
+            ],
         )
     return df
 
 
+SQL_GET_PROJECT_DOCUMENT = text("""
+    SELECT project_name, document_path, document_name, document
+    FROM special_projects
+    WHERE id = :pid
+""")
+
+
+def get_project_document(project_id):
+    """
+    Return (file_name, data) for a project's document, or None.
+    Only called on demand so the project list never carries document bytes.
+    Projects created before documents moved to disk still have them in the
+    legacy `document` column.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(
+            SQL_GET_PROJECT_DOCUMENT,
+            {"pid": int(project_id)},
+        ).one_or_none()
+
+    if row is None:
+        return None
+
+    if row.document_path:
+        if not os.path.exists(row.document_path):
+            return None
+        suffix = os.path.splitext(row.document_path)[1]
+        file_name = row.document_name or f"{row.project_name}{suffix}"
+        with open(row.document_path, "rb") as f:
+            return file_name, f.read()
+
+    if row.document is not None:
+        return f"{row.project_name}.bin", bytes(row.document)
+
+    return None
+
+
 # ==========================
 # SPECIAL CONTRIBUTIONS
 # ==========================
+SQL_INSERT_SPECIAL_CONTRIBUTION = text("""
+    INSERT INTO special_contributions (project_id, name, amount, notes)
+    VALUES (:pid, :name, :amount, :notes)
+""")
+
+
 def add_special_project_contribution(project_id, name, amount, notes):
     with engine.begin() as conn:
         conn.execute(
-            text("""
-                INSERT INTO special_contributions (project_id, name, amount, notes)
-                VALUES (:pid, :name, :amount, :notes)
-            """),
+            SQL_INSERT_SPECIAL_CONTRIBUTION,
             {
                 "pid": project_id,
                 "name": name,
@@ -167,110 +598,193 @@ def add_special_project_contribution(project_id, name, amount, notes):
                 "notes": notes,
             },
         )
+    _invalidate_special_contributions()
+
 
+SQL_GET_SPECIAL_CONTRIBUTIONS = text("""
+    SELECT id, name, amount, notes, created_at
+    FROM special_contributions
+    WHERE project_id = :pid
+    ORDER BY created_at DESC
+""")
 
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_special_project_contributions(project_id):
     with engine.connect() as conn:
-        df = pd.read_sql(
-            text("""
-                SELECT id, name, amount, notes, created_at
-                FROM special_contributions
-                WHERE project_id = :pid
-                ORDER BY created_at DESC
-            """),
+        df = _fetch_df(
             conn,
+            SQL_GET_SPECIAL_CONTRIBUTIONS,
+            ["id", "name", "amount", "notes", "created_at"],
             params={"pid": project_id},
         )
     return df
 
 
-def delete_special_contribution_with_reason(contrib_id, deleted_by, reason):
-    contrib_id = int(contrib_id)  # FIX
+SQL_GET_ALL_SPECIAL_CONTRIBUTIONS = text("""
+    SELECT id, project_id, name, amount, notes, created_at
+    FROM special_contributions
+    ORDER BY created_at DESC
+""")
 
-    with engine.begin() as conn:
-        conn.execute(
-            text("""
-                INSERT INTO deletion_logs (record_type, record_id, deleted_by, reason)
-                VALUES ('special_contribution', :id, :user, :reason)
-            """),
-            {"id": contrib_id, "user": deleted_by, "reason": reason},
-        )
-        conn.execute(
-            text("DELETE FROM special_contributions WHERE id = :id"),
-            {"id": contrib_id},
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_all_special_contributions():
+    """Contributions for every project in one query (partition by project_id)."""
+    with engine.connect() as conn:
+        df = _fetch_df(
+            conn,
+            SQL_GET_ALL_SPECIAL_CONTRIBUTIONS,
+            ["id", "project_id", "name", "amount", "notes", "created_at"],
         )
+    return df
+
+
+def delete_special_contribution_with_reason(contrib_id, deleted_by, reason):
+    deleted = _log_and_delete("special_contribution", contrib_id, deleted_by, reason)
+    _invalidate_special_contributions()
+    return deleted
+
+
+def _invalidate_special_contributions():
+    for reader in (
+        get_special_project_contributions,
+        get_all_special_contributions,
+        get_all_special_projects,
+        get_project_financial_summary,
+    ):
+        reader.clear()
 
 
 
 # ==========================
 # PROJECT INCOME
 # ==========================
+SQL_INSERT_PROJECT_INCOME = text("""
+    INSERT INTO project_income (project_id, source, amount, notes)
+    VALUES (:pid, :source, :amount, :notes)
+""")
+
+
 def add_project_income(project_id, source, amount, notes):
+    add_project_income_bulk([
+        {"project_id": project_id, "source": source, "amount": amount, "notes": notes}
+    ])
+
+
+def add_project_income_bulk(rows):
+    """
+    Insert many income rows in one transaction (executemany).
+    rows: list of dicts with project_id, source, amount, notes
+    """
+    if not rows:
+        return
+    params = [
+        {
+            "pid": int(r["project_id"]),
+            "source": r["source"],
+            "amount": float(r["amount"]),
+            "notes": r.get("notes"),
+        }
+        for r in rows
+    ]
     with engine.begin() as conn:
-        conn.execute(
-            text("""
-                INSERT INTO project_income (project_id, source, amount, notes)
-                VALUES (:pid, :source, :amount, :notes)
-            """),
-            {
-                "pid": project_id,
-                "source": source,
-                "amount": float(amount),
-                "notes": notes,
-            },
-        )
+        conn.execute(SQL_INSERT_PROJECT_INCOME, params)
+    _invalidate_project_income()
+
 
+# amount stays float64: float32 can't hold cents exactly past ~$100k.
+INCOME_DTYPES = {
+    "id": "int64",
+    "project_id": "int64",
+    "source": "category",
+    "notes": "string",
+    "amount": "float64",
+}
 
+
+def _type_income(df):
+    """Typed columns for income frames instead of object-dtype inference."""
+    df = df.astype({col: dtype for col, dtype in INCOME_DTYPES.items() if col in df})
+    df["created_at"] = pd.to_datetime(df["created_at"])
+    return df
+
+
+SQL_GET_PROJECT_INCOME = text("""
+    SELECT id, source, amount, notes, created_at
+    FROM project_income
+    WHERE project_id = :pid
+    ORDER BY created_at DESC
+""")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_project_income(project_id):
     with engine.connect() as conn:
-        df = pd.read_sql(
-            text("""
-                SELECT id, source, amount, notes, created_at
-                FROM project_income
-                WHERE project_id = :pid
-                ORDER BY created_at DESC
-            """),
+        df = _fetch_df(
             conn,
+            SQL_GET_PROJECT_INCOME,
+            ["id", "source", "amount", "notes", "created_at"],
             params={"pid": project_id},
         )
-    return df
+    return _type_income(df)
 
 
-def delete_project_income_with_reason(income_id, deleted_by, reason):
-    income_id = int(income_id)  # FIX
+SQL_GET_ALL_PROJECT_INCOMES = text("""
+    SELECT id, project_id, source, amount, notes, created_at
+    FROM project_income
+    ORDER BY created_at DESC
+""")
 
-    with engine.begin() as conn:
-        conn.execute(
-            text("""
-                INSERT INTO deletion_logs (record_type, record_id, deleted_by, reason)
-                VALUES ('project_income', :id, :user, :reason)
-            """),
-            {"id": income_id, "user": deleted_by, "reason": reason},
-        )
-        conn.execute(
-            text("DELETE FROM project_income WHERE id = :id"),
-            {"id": income_id},
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_all_project_incomes():
+    """Income for every project in one query (partition by project_id)."""
+    with engine.connect() as conn:
+        df = _fetch_df(
+            conn,
+            SQL_GET_ALL_PROJECT_INCOMES,
+            ["id", "project_id", "source", "amount", "notes", "created_at"],
         )
+    return _type_income(df)
+
+
+def delete_project_income_with_reason(income_id, deleted_by, reason):
+    deleted = _log_and_delete("project_income", income_id, deleted_by, reason)
+    _invalidate_project_income()
+    return deleted
+
+
+def _invalidate_project_income():
+    for reader in (
+        get_project_income,
+        get_all_project_incomes,
+        get_all_special_projects,
+        get_project_financial_summary,
+    ):
+        reader.clear()
 
 
 
 # ==========================
 # FINANCIAL SUMMARY
 # ==========================
-def get_project_financial_summary(project_id):
-    with engine.connect() as conn:
-        contrib = conn.execute(
-            text("SELECT COALESCE(SUM(amount), 0) FROM special_contributions WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).scalar() or 0.0
+SQL_PROJECT_FINANCIAL_SUMMARY = text("""
+    SELECT contrib_sum, income_sum, contrib_sum + income_sum AS total
+    FROM project_financial_totals
+    WHERE project_id = :pid
+""")
 
-        income = conn.execute(
-            text("SELECT COALESCE(SUM(amount), 0) FROM project_income WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).scalar() or 0.0
 
-    return {
-        "contributions": float(contrib),
-        "income": float(income),
-        "total": float(contrib) + float(income),
-    }
+@st.cache_data(ttl=60, show_spinner=False)
+def get_project_financial_summary(project_id):
+    """Single primary-key lookup in the trigger-maintained roll-up table."""
+    with engine.connect() as conn:
+        row = conn.execute(
+            SQL_PROJECT_FINANCIAL_SUMMARY,
+            {"pid": int(project_id)},
+        ).one_or_none()
+
+    if row is None:
+        return {"contributions": 0.0, "income": 0.0, "total": 0.0}
+    return {"contributions": row[0], "income": row[1], "total": row[2]}